@@ -4,9 +4,12 @@ import datetime
 import time
 import re
 import asyncio
+import heapq
 import logging
 import html
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import itertools
+import json
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, MessageEntity
 from telegram.ext import (
     ApplicationBuilder,
     MessageHandler,
@@ -15,10 +18,13 @@ from telegram.ext import (
     ConversationHandler,
     CallbackQueryHandler,
     ContextTypes,
-    Application
+    Application,
+    TypeHandler,
+    ApplicationHandlerStop
 )
-from telegram.error import BadRequest, TelegramError, NetworkError
-from typing import Set, Dict, Any, Union
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, TelegramError, NetworkError, RetryAfter, Forbidden
+from typing import Set, Dict, Any, Union, List, Tuple
 import pytz
 
 # --- Enable Live Terminal Logging ---
@@ -27,6 +33,7 @@ logging.basicConfig(
     level=logging.INFO
 )
 logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
 
 try:
     from dotenv import load_dotenv
@@ -162,17 +169,49 @@ GUIDE_TEXT = (
     "- User that is banned with the request of Mod is not allowed to appeal."
 )
 
+DELETE_TIMEOUT_TEXT = (
+    "⚠️ <b>Timeout Applied (1 Minute)</b>\n\n"
+    "You typed 'delete'. To delete a confession, you must forward the actual message from the channel here.\n\n"
+    + GUIDE_TEXT
+)
+
+MENU_PROMPT_TEXT = "Send any text or photo to post it anonymously to the channel.\n\nClick a button below for more options:"
+
 TNC_TEXT = (
     "👋 Welcome to Tapah Confession Bot!\n\n"
     "By tapping below, you acknowledge and agree to fully abide by the terms, structural rules, "
     "and timeout regulations outlined in our operational guide."
 )
 
-global_next_post_time = None
+global_next_post_time: float = 0.0
+
+user_delete_cooldowns: Dict[int, float] = {}
+user_link_cooldowns: Dict[int, float] = {}
+user_photo_cooldowns: Dict[int, float] = {} 
+
+# --- Cooldown Expiry (lazy eviction keeps the maps bounded to active users) ---
+COOLDOWN_TABLES: Dict[str, Dict[int, float]] = {
+    'delete': user_delete_cooldowns,
+    'link': user_link_cooldowns,
+    'photo': user_photo_cooldowns
+}
+COOLDOWN_TTLS = {kind: max(cfg[f'{kind}_cooldown'] for cfg in TIER_CONFIG.values()) for kind in COOLDOWN_TABLES}
+cooldown_expiry_heap: List[Tuple[float, int, str, float]] = []
 
-user_delete_cooldowns: Dict[int, datetime.datetime] = {}
-user_link_cooldowns: Dict[int, datetime.datetime] = {}
-user_photo_cooldowns: Dict[int, datetime.datetime] = {} 
+def evict_expired_cooldowns(now: float):
+    while cooldown_expiry_heap and cooldown_expiry_heap[0][0] <= now:
+        _, uid, kind, stamp = heapq.heappop(cooldown_expiry_heap)
+        table = COOLDOWN_TABLES[kind]
+        if table.get(uid) == stamp: del table[uid]
+
+def start_cooldown(kind: str, uid: int, now: float):
+    COOLDOWN_TABLES[kind][uid] = now
+    heapq.heappush(cooldown_expiry_heap, (now + COOLDOWN_TTLS[kind], uid, kind, now))
+    evict_expired_cooldowns(now)
+
+def get_cooldown_remaining(kind: str, uid: int, limit: float, now: float) -> float:
+    last = COOLDOWN_TABLES[kind].get(uid)
+    return limit - (now - last) if last is not None else 0
 
 AWAITING_HELP_MESSAGE = 0
 action_states: Dict[int, str] = {}
@@ -191,12 +230,22 @@ try:
 except ValueError:
     sys.exit(1)
 
+def get_channel_id_aliases(channel_id: str) -> frozenset:
+    aliases = {channel_id, f"@{channel_id.lstrip('@')}"}
+    bare_id = channel_id[4:] if channel_id.startswith("-100") else channel_id.lstrip('-')
+    if bare_id.isdigit(): aliases.add(f"-100{bare_id}")
+    return frozenset(aliases)
+
+CHANNEL_ID_ALIASES = get_channel_id_aliases(CHANNEL_ID)
+
 def load_ids(filename):
     ids = set()
     try:
         if os.path.exists(filename):
             with open(filename, "r", encoding="utf-8") as f:
-                ids = {int(line.strip()) for line in f if line.strip().isdigit()}
+                for line in f:
+                    try: ids.add(int(line))
+                    except ValueError: pass
         else:
             open(filename, "a", encoding="utf-8").close()
     except: pass
@@ -205,6 +254,7 @@ def load_ids(filename):
 KNOWN_USERS = load_ids("users.txt")
 MODERATORS = load_ids("moderators.txt") 
 AGREED_USERS = load_ids("agreed_users.txt") 
+BLOCKED_USERS = load_ids("blocked_users.txt")
 
 def load_time_settings():
     global START_HOUR, END_HOUR
@@ -283,26 +333,51 @@ try:
     if os.path.exists("banned_users.txt"):
         with open("banned_users.txt", "r", encoding="utf-8") as f:
             for line in f:
-                line = line.strip()
-                if not line: continue
-                parts = line.split(',', 1) 
-                uid = int(parts[0])
-                reason = parts[1] if len(parts) > 1 else "No reason provided."
-                BANNED_USERS[uid] = reason
+                uid, _, reason = line.strip().partition(',')
+                try: BANNED_USERS[int(uid)] = reason or "No reason provided."
+                except ValueError: pass
 except: pass
 
-USER_TIMEOUTS: Dict[int, Dict[str, Union[float, str]]] = {}
-try:
-    with open("timeouts.txt", "r", encoding="utf-8") as f:
-        for line in f:
-            if "," in line:
-                parts = line.strip().split(',', 2) 
-                uid = int(parts[0])
-                timestamp = float(parts[1])
-                reason = parts[2] if len(parts) > 2 else "No reason provided."
-                if float(timestamp) > time.time():
-                    USER_TIMEOUTS[int(uid)] = {'expiry': timestamp, 'reason': reason}
-except: open("timeouts.txt", "a", encoding="utf-8").close()
+def load_timeouts() -> Dict[int, Dict[str, Union[float, str]]]:
+    timeouts = {}
+    now = time.time()
+    try:
+        if os.path.exists("timeouts.json"):
+            with open("timeouts.json", "r", encoding="utf-8") as f:
+                for uid, (timestamp, reason) in json.load(f).items():
+                    if timestamp > now:
+                        timeouts[int(uid)] = {'expiry': timestamp, 'reason': reason}
+        elif os.path.exists("timeouts.txt"):
+            # Legacy format, rewritten as timeouts.json on the next save.
+            with open("timeouts.txt", "r", encoding="utf-8") as f:
+                for line in f:
+                    if "," in line:
+                        parts = line.strip().split(',', 2) 
+                        uid = int(parts[0])
+                        timestamp = float(parts[1])
+                        reason = parts[2] if len(parts) > 2 else "No reason provided."
+                        if timestamp > now:
+                            timeouts[uid] = {'expiry': timestamp, 'reason': reason}
+    except: pass
+    return timeouts
+
+USER_TIMEOUTS: Dict[int, Dict[str, Union[float, str]]] = load_timeouts()
+
+# Min-heap of (expiry, uid) so expired timeouts are dropped without scanning USER_TIMEOUTS.
+timeout_expiry_heap: List[Tuple[float, int]] = [(data['expiry'], uid) for uid, data in USER_TIMEOUTS.items()]
+heapq.heapify(timeout_expiry_heap)
+
+def set_user_timeout(uid: int, expiry: float, reason: str):
+    USER_TIMEOUTS[uid] = {'expiry': expiry, 'reason': reason}
+    heapq.heappush(timeout_expiry_heap, (expiry, uid))
+    mark_dirty('timeouts')
+
+def evict_expired_timeouts(now: float):
+    while timeout_expiry_heap and timeout_expiry_heap[0][0] <= now:
+        expiry, uid = heapq.heappop(timeout_expiry_heap)
+        if uid in USER_TIMEOUTS and USER_TIMEOUTS[uid]['expiry'] == expiry:
+            del USER_TIMEOUTS[uid]
+            mark_dirty('timeouts')
 
 BANNED_WORDS: Set[str] = set()
 try:
@@ -311,24 +386,92 @@ try:
             BANNED_WORDS = {line.strip().lower() for line in f if line.strip()}
 except: pass
 
+BANNED_WORDS_PATTERN = None
+
+def rebuild_banned_words_pattern():
+    global BANNED_WORDS_PATTERN
+    if not BANNED_WORDS:
+        BANNED_WORDS_PATTERN = None
+        return
+    alternatives = []
+    for word in sorted(BANNED_WORDS, key=len, reverse=True):
+        escaped = re.escape(word)
+        alternatives.append(r'(?<!\w)' + escaped + r'(?!\w)' if re.fullmatch(r'\w+', word) else escaped)
+    BANNED_WORDS_PATTERN = re.compile('|'.join(alternatives), re.IGNORECASE)
+
+rebuild_banned_words_pattern()
+
 def is_owner_or_mod(uid): return uid == OWNER_ID or uid in MODERATORS
 def is_owner(uid): return uid == OWNER_ID
 
+# Command-level permission filters, so unauthorised commands are dropped at routing time.
+OWNER_FILTER = filters.User(user_id=OWNER_ID)
+STAFF_FILTER = filters.User(user_id=MODERATORS | {OWNER_ID})
+
+def write_text_atomic(filename, text):
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_filename, filename)
+
+def write_lines_atomic(filename, lines):
+    write_text_atomic(filename, "".join(f"{line}\n" for line in lines))
+
 def save_timeouts():
-    with open("timeouts.txt", "w", encoding="utf-8") as f:
-        for uid, data in USER_TIMEOUTS.items():
-            if data['expiry'] > time.time(): f.write(f"{uid},{data['expiry']},{data['reason']}\n")
+    now = time.time()
+    active = {uid: (data['expiry'], data['reason']) for uid, data in USER_TIMEOUTS.items() if data['expiry'] > now}
+    write_text_atomic("timeouts.json", json.dumps(active, ensure_ascii=False))
+
+def save_banned_users():
+    write_lines_atomic("banned_users.txt", (f"{u},{r}" for u, r in BANNED_USERS.items()))
+
+def save_banned_words():
+    write_lines_atomic("banned_words.txt", BANNED_WORDS)
+
+pending_new_users: List[int] = []
+
+def flush_pending_new_users():
+    with open("users.txt", "a", encoding="utf-8") as f: f.write("".join(f"{uid}\n" for uid in pending_new_users))
+    pending_new_users.clear()
+
+def save_blocked_users():
+    write_lines_atomic("blocked_users.txt", BLOCKED_USERS)
+
+# --- Debounced Persistence (flushed by a JobQueue timer and at shutdown) ---
+# Additions are appended straight to disk; only removals need a full rewrite.
+PERSISTERS = {'timeouts': save_timeouts, 'banned_users': save_banned_users, 'banned_words': save_banned_words, 'users': flush_pending_new_users, 'blocked_users': save_blocked_users}
+dirty_stores: Set[str] = set()
+
+def mark_dirty(store: str): dirty_stores.add(store)
+
+def flush_dirty_stores():
+    for store in list(dirty_stores):
+        try:
+            PERSISTERS[store]()
+            dirty_stores.discard(store)
+        except OSError: logger.exception("Could not save %s, will retry on next flush", store)
+
+async def flush_dirty_stores_job(context: ContextTypes.DEFAULT_TYPE):
+    evict_expired_cooldowns(time.monotonic())
+    evict_expired_timeouts(time.time())
+    flush_dirty_stores()
 
 def save_agreed_user(uid):
     if uid not in AGREED_USERS:
         AGREED_USERS.add(uid)
         with open("agreed_users.txt", "a", encoding="utf-8") as f: f.write(f"{uid}\n")
 
+async def ban_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    if not user or user.id not in BANNED_USERS or is_owner_or_mod(user.id): return
+    if update.callback_query:
+        await update.callback_query.answer("🚫 You are permanently banned.", show_alert=True)
+    elif update.message and update.effective_chat.type == 'private':
+        await update.message.reply_text(f"🚫 You are permanently banned.\n<b>Reason:</b> {html.escape(BANNED_USERS[user.id])}", parse_mode='HTML')
+    raise ApplicationHandlerStop
+
 async def is_user_restricted(user_id, update: Update):
     if is_owner_or_mod(user_id): return False 
-    if user_id in BANNED_USERS:
-        await update.message.reply_text(f"🚫 You are permanently banned.\n<b>Reason:</b> {html.escape(BANNED_USERS[user_id])}", parse_mode='HTML')
-        return True
     if user_id in USER_TIMEOUTS:
         expiry = USER_TIMEOUTS[user_id]['expiry']
         reason = USER_TIMEOUTS[user_id]['reason']
@@ -339,7 +482,7 @@ async def is_user_restricted(user_id, update: Update):
             return True
         else:
             del USER_TIMEOUTS[user_id]
-            save_timeouts()
+            mark_dirty('timeouts')
     return False
 
 def format_time(hour_24):
@@ -348,69 +491,94 @@ def format_time(hour_24):
     if h == 0: h = 12
     return f"{h:02d}:00 {am_pm}"
 
-def is_bot_active():
-    now = datetime.datetime.now(TIMEZONE)
-    current_hour = now.hour
-    if START_HOUR <= current_hour or current_hour < END_HOUR: return True
-    return False
+# (valid_until, is_active, wake_at) as epoch seconds. The active window only
+# changes on the hour, so the state is recomputed at most once per hour.
+active_state_cache: Tuple[float, bool, float] = (0.0, False, 0.0)
 
-def get_seconds_until_active():
-    now = datetime.datetime.now(TIMEZONE)
-    target = now.replace(hour=START_HOUR, minute=0, second=0, microsecond=0)
+def get_active_state(now_ts: float) -> Tuple[float, bool, float]:
+    global active_state_cache
+    if now_ts < active_state_cache[0]: return active_state_cache
+    now = datetime.datetime.fromtimestamp(now_ts, TIMEZONE)
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    target = hour_start.replace(hour=START_HOUR)
     if now.hour >= START_HOUR: target += datetime.timedelta(days=1)
-    return (target - now).total_seconds()
+    active_state_cache = (hour_start.timestamp() + 3600, START_HOUR <= now.hour or now.hour < END_HOUR, target.timestamp())
+    return active_state_cache
+
+def invalidate_active_state():
+    global active_state_cache
+    active_state_cache = (0.0, False, 0.0)
+
+def is_bot_active():
+    return get_active_state(time.time())[1]
 
 def save_user(uid):
     if uid not in KNOWN_USERS:
         KNOWN_USERS.add(uid)
-        with open("users.txt", "a", encoding="utf-8") as f: f.write(f"{uid}\n")
+        pending_new_users.append(uid)
+        mark_dirty('users')
+    if uid in BLOCKED_USERS:
+        BLOCKED_USERS.discard(uid)
+        mark_dirty('blocked_users')
 
 def check_for_banned_words(text: str) -> bool:
-    if not text: return False
-    text_lower = text.lower()
-    for word in BANNED_WORDS:
-        if re.match(r'^\w+$', word):
-            pattern = r'(?<!\w)' + re.escape(word) + r'(?!\w)'
-            if re.search(pattern, text_lower): return True
-        else:
-            if word in text_lower: return True
-    return False
+    if not text or BANNED_WORDS_PATTERN is None: return False
+    return BANNED_WORDS_PATTERN.search(text) is not None
+
+LINK_ENTITY_TYPES = frozenset((MessageEntity.URL, MessageEntity.TEXT_LINK))
 
 def contains_link(message) -> bool:
-    text = (message.text or message.caption or "").lower()
-    return "http://" in text or "https://" in text or "www." in text
+    return any(entity.type in LINK_ENTITY_TYPES for entity in itertools.chain(message.entities, message.caption_entities))
+
+LOG_MESSAGE_TEMPLATE = (
+    "<b>New {content_type} Confession Log</b>\n\n"
+    "<b>User ID:</b> <code>{uid}</code>\n"
+    "<b>Name:</b> {name}\n"
+    "<b>Username:</b> {username}\n\n"
+)
+MOD_LOG_MESSAGE_TEMPLATE = (
+    "<b>New {content_type} Confession Log (Moderator View)</b>\n\n"
+    "<b>User ID:</b> <code>{uid}</code>\n\n"
+)
+LOG_CONTENT_TEMPLATE = "<b>Content:</b>\n{content}"
+DELETE_LOG_TEMPLATE = (
+    "🗑 <b>DELETION LOG</b>\n<b>By:</b> {name} (<code>{uid}</code>)\n<b>Username:</b> {username}\n"
+    "<b>Msg ID:</b> <code>{msg_id}</code>\n<b>Original Content:</b>\n{content}"
+)
+MOD_DELETE_LOG_TEMPLATE = (
+    "🗑 <b>DELETION LOG (Moderator View)</b>\n<b>By User ID:</b> <code>{uid}</code>\n"
+    "<b>Msg ID:</b> <code>{msg_id}</code>\n<b>Original Content:</b>\n{content}"
+)
 
 def create_log_message(job_info: Dict[str, Any], content_type: str, text_content: str = None) -> str:
     raw_username = job_info.get('username')
-    display_username = f"@{html.escape(raw_username)}" if raw_username else "Not available"
-    safe_name = html.escape(str(job_info['user_name']))
-    safe_uid = html.escape(str(job_info['user_id']))
-    
-    log_message = (
-        f"<b>New {content_type} Confession Log</b>\n\n"
-        f"<b>User ID:</b> <code>{safe_uid}</code>\n"
-        f"<b>Name:</b> {safe_name}\n"
-        f"<b>Username:</b> {display_username}\n\n"
+    log_message = LOG_MESSAGE_TEMPLATE.format(
+        content_type=content_type,
+        uid=job_info['user_id'],
+        name=html.escape(str(job_info['user_name'])),
+        username=f"@{raw_username}" if raw_username else "Not available"
     )
     content_to_log = text_content or job_info.get('caption')
-    if content_to_log: log_message += f"<b>Content:</b>\n{html.escape(content_to_log)}"
+    if content_to_log: log_message += LOG_CONTENT_TEMPLATE.format(content=html.escape(content_to_log))
     return log_message
 
 def create_mod_log_message(job_info: Dict[str, Any], content_type: str, text_content: str = None) -> str:
-    safe_uid = html.escape(str(job_info['user_id']))
-    log_message = (
-        f"<b>New {content_type} Confession Log (Moderator View)</b>\n\n"
-        f"<b>User ID:</b> <code>{safe_uid}</code>\n\n"
-    )
+    log_message = MOD_LOG_MESSAGE_TEMPLATE.format(content_type=content_type, uid=job_info['user_id'])
     content_to_log = text_content or job_info.get('caption')
-    if content_to_log: log_message += f"<b>Content:</b>\n{html.escape(content_to_log)}"
+    if content_to_log: log_message += LOG_CONTENT_TEMPLATE.format(content=html.escape(content_to_log))
     return log_message
 
-def get_tnc_keyboard():
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("📖 Read Guide", callback_data='tc_guide')],
-        [InlineKeyboardButton("✅ I Agree", callback_data='tc_agree')]
-    ])
+TNC_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📖 Read Guide", callback_data='tc_guide')],
+    [InlineKeyboardButton("✅ I Agree", callback_data='tc_agree')]
+])
+TNC_GUIDE_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to T&C", callback_data='tc_back')]])
+BACK_TO_MENU_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
+
+async def prompt_tnc_if_needed(update: Update, user_id: int) -> bool:
+    if user_id in AGREED_USERS or is_owner(user_id): return False
+    await update.message.reply_text(TNC_TEXT, reply_markup=TNC_KEYBOARD)
+    return True
 
 def get_main_menu(user_id):
     keyboard = []
@@ -449,32 +617,56 @@ async def post_text(context: ContextTypes.DEFAULT_TYPE):
     try:
         msg = await context.bot.send_message(chat_id=job_info['chat_id'], text=job_info['text'], read_timeout=20)
         append_post_history(msg.message_id, job_info['user_id'], job_info['is_immune'])
-        await context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=create_log_message(job_info, "Text", job_info['text']), parse_mode='HTML', read_timeout=20)
-        await context.bot.send_message(chat_id=MOD_LOG_CHANNEL_ID, text=create_mod_log_message(job_info, "Text", job_info['text']), parse_mode='HTML', read_timeout=20)
-    except Exception as e: print(f"Post Error: {e}")
+        await asyncio.gather(
+            context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=create_log_message(job_info, "Text", job_info['text']), parse_mode='HTML', read_timeout=20),
+            context.bot.send_message(chat_id=MOD_LOG_CHANNEL_ID, text=create_mod_log_message(job_info, "Text", job_info['text']), parse_mode='HTML', read_timeout=20)
+        )
+    except Exception: logger.exception("Post Error")
+
+async def send_photo_log(context: ContextTypes.DEFAULT_TYPE, chat_id, job_info: Dict[str, Any], log_text: str):
+    # len() is only a pre-check: Telegram counts the parsed caption in UTF-16 units,
+    # so emoji-heavy captions can still be rejected and take the split path.
+    if len(log_text) <= MessageLimit.CAPTION_LENGTH:
+        try:
+            await context.bot.send_photo(chat_id=chat_id, photo=job_info['photo'], caption=log_text, parse_mode='HTML', read_timeout=30)
+            return
+        except BadRequest: pass
+    await context.bot.send_photo(chat_id=chat_id, photo=job_info['photo'], caption=job_info['caption'])
+    await context.bot.send_message(chat_id=chat_id, text=log_text, parse_mode='HTML', read_timeout=30)
 
 async def post_photo(context: ContextTypes.DEFAULT_TYPE):
     job_info = context.job.data
     try:
         msg = await context.bot.send_photo(chat_id=job_info['chat_id'], photo=job_info['photo'], caption=job_info['caption'], read_timeout=30)
         append_post_history(msg.message_id, job_info['user_id'], job_info['is_immune'])
-        await context.bot.send_photo(chat_id=LOG_CHANNEL_ID, photo=job_info['photo'], caption=job_info['caption'])
-        await context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=create_log_message(job_info, "Photo"), parse_mode='HTML', read_timeout=30)
-        await context.bot.send_photo(chat_id=MOD_LOG_CHANNEL_ID, photo=job_info['photo'], caption=job_info['caption'])
-        await context.bot.send_message(chat_id=MOD_LOG_CHANNEL_ID, text=create_mod_log_message(job_info, "Photo"), parse_mode='HTML', read_timeout=30)
-    except Exception as e: print(f"Post Error: {e}")
+        await asyncio.gather(
+            send_photo_log(context, LOG_CHANNEL_ID, job_info, create_log_message(job_info, "Photo")),
+            send_photo_log(context, MOD_LOG_CHANNEL_ID, job_info, create_mod_log_message(job_info, "Photo"))
+        )
+    except Exception: logger.exception("Post Error")
 
 async def group_auto_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not AUTO_REPLY_ENABLED: return
     msg = update.message
     if not msg or not msg.from_user: return
-    if str(msg.from_user.id) == str(OWNER_ID): return
+    if msg.from_user.id == OWNER_ID: return
     raw_msg = msg.to_dict()
     is_channel_dm = raw_msg.get('chat', {}).get('is_direct_messages', False)
     if is_channel_dm:
         try: await msg.reply_text(AUTO_REPLY_TEXT)
         except: pass
 
+POST_COOLDOWN_LABELS = {'photo': "Photos", 'link': "Links"}
+
+async def enforce_post_cooldown(update: Update, kind: str, user_id: int, limit: float) -> bool:
+    now = time.monotonic()
+    rem = get_cooldown_remaining(kind, user_id, limit, now)
+    if rem > 0:
+        await update.message.reply_text(f"⏳ {POST_COOLDOWN_LABELS[kind]} limited to once every {format_duration(limit)}. Please wait {format_duration(rem)}.")
+        return False
+    start_cooldown(kind, user_id, now)
+    return True
+
 async def _schedule_post(update: Update, context: ContextTypes.DEFAULT_TYPE, post_type: str):
     global global_next_post_time
     if not update.message or not update.message.from_user: return
@@ -482,9 +674,7 @@ async def _schedule_post(update: Update, context: ContextTypes.DEFAULT_TYPE, pos
     user_id = user.id
     save_user(user_id)
     
-    if user_id not in AGREED_USERS and not is_owner(user_id):
-        await update.message.reply_text(TNC_TEXT, reply_markup=get_tnc_keyboard())
-        return
+    if await prompt_tnc_if_needed(update, user_id): return
 
     is_privileged = is_owner_or_mod(user_id)
     if await is_user_restricted(user_id, update): return
@@ -494,11 +684,9 @@ async def _schedule_post(update: Update, context: ContextTypes.DEFAULT_TYPE, pos
     
     if post_type == 'text' and text_stripped.lower() == 'delete':
         if not is_privileged:
-            expiry_time = time.time() + 60
-            USER_TIMEOUTS[user.id] = {'expiry': expiry_time, 'reason': "Invalid deletion attempt."}
-            save_timeouts()
+            set_user_timeout(user.id, time.time() + 60, "Invalid deletion attempt.")
             
-            await update.message.reply_text(f"⚠️ <b>Timeout Applied (1 Minute)</b>\n\nYou typed 'delete'. To delete a confession, you must forward the actual message from the channel here.\n\n{GUIDE_TEXT}", parse_mode='HTML')
+            await update.message.reply_text(DELETE_TIMEOUT_TEXT, parse_mode='HTML')
             
             str_id = str(user.id)
             masked_id = str_id[:4] + "*" * (len(str_id) - 4)
@@ -520,52 +708,38 @@ async def _schedule_post(update: Update, context: ContextTypes.DEFAULT_TYPE, pos
         if not PHOTOS_ENABLED and not is_privileged:
             await update.message.reply_text("❌ Photo confessions are currently disabled.")
             return
-        if not is_privileged:
-            now = datetime.datetime.now()
-            last_photo = user_photo_cooldowns.get(user_id)
-            if last_photo and (now - last_photo).total_seconds() < cfg['photo_cooldown']:
-                rem = cfg['photo_cooldown'] - (now - last_photo).total_seconds()
-                await update.message.reply_text(f"⏳ Photos limited to once every {format_duration(cfg['photo_cooldown'])}. Please wait {format_duration(rem)}.")
-                return
-            user_photo_cooldowns[user_id] = now
+        if not is_privileged and not await enforce_post_cooldown(update, 'photo', user_id, cfg['photo_cooldown']): return
 
-    if check_for_banned_words(text_to_check) and not is_privileged:
+    if not is_privileged and check_for_banned_words(text_to_check):
         await update.message.reply_text("❌ Your message contains words that are not allowed.")
         return
 
-    if contains_link(update.message):
-        if not LINKS_ENABLED and not is_privileged:
+    if not is_privileged and contains_link(update.message):
+        if not LINKS_ENABLED:
             await update.message.reply_text("❌ Link sharing is currently disabled.")
             return
-        if not is_privileged:
-            now = datetime.datetime.now()
-            last_link = user_link_cooldowns.get(user_id)
-            if last_link and (now - last_link).total_seconds() < cfg['link_cooldown']:
-                rem = cfg['link_cooldown'] - (now - last_link).total_seconds()
-                await update.message.reply_text(f"⏳ Links limited to once every {format_duration(cfg['link_cooldown'])}. Please wait {format_duration(rem)}.")
-                return
-            user_link_cooldowns[user_id] = now
+        if not await enforce_post_cooldown(update, 'link', user_id, cfg['link_cooldown']): return
 
-    now_tz = datetime.datetime.now(TIMEZONE)
+    now = time.time()
     base_delay = 0
-    if not is_bot_active() and not is_privileged:
-        base_delay = get_seconds_until_active()
+    if not is_privileged:
+        _, active, wake_at = get_active_state(now)
+        if not active: base_delay = wake_at - now
         
-    if global_next_post_time is None or global_next_post_time < now_tz:
-        global_next_post_time = now_tz
+    if global_next_post_time < now:
+        global_next_post_time = now
 
     if is_privileged or 'spotlight' in active_perks:
         final_delay = 0 
-        scheduled_time = now_tz
+        scheduled_time = now
     else:
-        wake_time = now_tz + datetime.timedelta(seconds=base_delay)
-        queue_start = max(now_tz, global_next_post_time, wake_time)
+        queue_start = max(global_next_post_time, now + base_delay)
         
         queue_duration = cfg['personal_queue_duration']
-        scheduled_time = queue_start + datetime.timedelta(seconds=queue_duration)
+        scheduled_time = queue_start + queue_duration
         
         global_next_post_time = scheduled_time
-        final_delay = (scheduled_time - now_tz).total_seconds()
+        final_delay = scheduled_time - now
     
     job_context = {'chat_id': CHANNEL_ID, 'user_id': user.id, 'user_name': user.first_name, 'username': user.username, 'is_immune': 'immunity' in active_perks}
     
@@ -577,10 +751,9 @@ async def _schedule_post(update: Update, context: ContextTypes.DEFAULT_TYPE, pos
         job_context['caption'] = text_to_check
         context.job_queue.run_once(post_photo, final_delay, data=job_context)
 
-    if final_delay == 0:
-        await update.message.reply_text("✅ Confession sent instantly!")
-    elif base_delay == 0 and final_delay > 0:
-        est_time_str = scheduled_time.strftime('%I:%M:%S %p')
+    if final_delay == 0: return
+    est_time_str = datetime.datetime.fromtimestamp(scheduled_time, TIMEZONE).strftime('%I:%M:%S %p')
+    if base_delay == 0:
         await update.message.reply_text(
             f"🕒 <b>Confession Queued!</b>\n"
             f"Wait Time: <b>{format_duration(final_delay)}</b>\n"
@@ -589,7 +762,6 @@ async def _schedule_post(update: Update, context: ContextTypes.DEFAULT_TYPE, pos
             parse_mode='HTML'
         )
     else:
-        est_time_str = scheduled_time.strftime('%I:%M:%S %p')
         await update.message.reply_text(f"🌙 Bot is currently in sleep mode. Your confession is queued for {est_time_str}.")
 
 async def handle_confession(update: Update, context: ContextTypes.DEFAULT_TYPE): await _schedule_post(update, context, 'text')
@@ -597,7 +769,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE): awai
 
 async def revoke_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Command for owner/dev to revoke a user subscription with reasoning."""
-    if not update.message or not is_owner(update.message.from_user.id): return
+    if not update.message: return
     if len(context.args) < 2:
         await update.message.reply_text("❌ Format: <code>/revoke <user_id> <reason></code>", parse_mode='HTML')
         return
@@ -638,9 +810,7 @@ async def revoke_subscription(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.from_user: return
     user_id = update.message.from_user.id
-    if user_id not in AGREED_USERS and not is_owner(user_id):
-        await update.message.reply_text(TNC_TEXT, reply_markup=get_tnc_keyboard())
-        return
+    if await prompt_tnc_if_needed(update, user_id): return
 
     if user_id in action_states:
         state = action_states[user_id]
@@ -666,22 +836,22 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_photo_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.from_user: return
     user_id = update.message.from_user.id
-    if user_id not in AGREED_USERS and not is_owner(user_id):
-        await update.message.reply_text(TNC_TEXT, reply_markup=get_tnc_keyboard())
-        return
+    if await prompt_tnc_if_needed(update, user_id): return
     if user_id in action_states:
         await update.message.reply_text("❌ Action cancelled. I was expecting text for the command.")
         del action_states[user_id]
         return
     await handle_photo(update, context)
 
+async def handle_private_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.message and update.message.photo: await handle_photo_input(update, context)
+    else: await handle_text_input(update, context)
+
 async def handle_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.from_user: return
     user = update.message.from_user
     user_id = user.id
-    if user_id not in AGREED_USERS and not is_owner(user_id):
-        await update.message.reply_text(TNC_TEXT, reply_markup=get_tnc_keyboard())
-        return
+    if await prompt_tnc_if_needed(update, user_id): return
     if await is_user_restricted(user.id, update): return
     
     target_chat = None
@@ -697,9 +867,9 @@ async def handle_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     if not target_chat or not msg_id: return
 
-    if target_chat == str(CHANNEL_ID) or f"@{CHANNEL_ID.lstrip('@')}" == target_chat:
+    if target_chat in CHANNEL_ID_ALIASES:
         is_privileged = is_owner_or_mod(user_id)
-        now = datetime.datetime.now()
+        now = time.monotonic()
         
         post_record = query_post_history(msg_id)
         current_tier = get_user_tier(user.id)
@@ -714,44 +884,36 @@ async def handle_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         if not is_privileged:
-            last_del = user_delete_cooldowns.get(user_id)
-            if last_del and (now - last_del).total_seconds() < cfg['delete_cooldown']:
-                rem = cfg['delete_cooldown'] - (now - last_del).total_seconds()
+            rem = get_cooldown_remaining('delete', user_id, cfg['delete_cooldown'], now)
+            if rem > 0:
                 await update.message.reply_text(f"⏳ Please wait {format_duration(rem)} before deleting again.")
                 return
 
         try:
             await context.bot.delete_message(chat_id=CHANNEL_ID, message_id=msg_id)
-            if not is_privileged: user_delete_cooldowns[user_id] = now
-            await update.message.reply_text("🗑 Message successfully deleted from channel.")
-            
-            content = update.message.text or update.message.caption or "[Media with no caption]"
-            raw_username = user.username
-            display_username = f"@{html.escape(raw_username)}" if raw_username else "Not available"
-            safe_user = html.escape(str(user.first_name))
-            safe_uid = html.escape(str(user_id))
-            safe_content = html.escape(content)
-            
-            owner_log_txt = (
-                f"🗑 <b>DELETION LOG</b>\n*By:* {safe_user} (<code>{safe_uid}</code>)\n*Username:* {display_username}\n"
-                f"*Msg ID:* <code>{msg_id}</code>\n*Original Content:*\n{safe_content}"
+            if not is_privileged: start_cooldown('delete', user_id, now)
+            safe_content = html.escape(update.message.text or update.message.caption or "[Media with no caption]")
+            owner_log_txt = DELETE_LOG_TEMPLATE.format(
+                name=html.escape(str(user.first_name)),
+                uid=user_id,
+                username=f"@{user.username}" if user.username else "Not available",
+                msg_id=msg_id,
+                content=safe_content
             )
-            await context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=owner_log_txt, parse_mode='HTML')
-
-            mod_log_txt = (
-                f"🗑 <b>DELETION LOG (Moderator View)</b>\n*By User ID:* <code>{safe_uid}</code>\n"
-                f"*Msg ID:* <code>{msg_id}</code>\n*Original Content:*\n{safe_content}"
+            mod_log_txt = MOD_DELETE_LOG_TEMPLATE.format(uid=user_id, msg_id=msg_id, content=safe_content)
+            await asyncio.gather(
+                update.message.reply_text("🗑 Message successfully deleted from channel."),
+                context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=owner_log_txt, parse_mode='HTML'),
+                context.bot.send_message(chat_id=MOD_LOG_CHANNEL_ID, text=mod_log_txt, parse_mode='HTML')
             )
-            await context.bot.send_message(chat_id=MOD_LOG_CHANNEL_ID, text=mod_log_txt, parse_mode='HTML')
-            
         except Exception as e: await update.message.reply_text(f"❌ Could not delete: {e}")
 
 async def add_mod(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         target = int(context.args[0])
         MODERATORS.add(target)
-        with open("moderators.txt", "w", encoding="utf-8") as f:
-            for m in MODERATORS: f.write(f"{m}\n")
+        STAFF_FILTER.add_user_ids(target)
+        write_lines_atomic("moderators.txt", MODERATORS)
         await update.message.reply_text(f"👮‍♂️ User <code>{target}</code> is now a Moderator.", parse_mode='HTML')
     except: pass
 
@@ -759,8 +921,8 @@ async def remove_mod(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         target = int(context.args[0])
         MODERATORS.discard(target)
-        with open("moderators.txt", "w", encoding="utf-8") as f:
-            for m in MODERATORS: f.write(f"{m}\n")
+        if target != OWNER_ID: STAFF_FILTER.remove_user_ids(target)
+        write_lines_atomic("moderators.txt", MODERATORS)
         await update.message.reply_text(f"✅ User <code>{target}</code> is no longer a Moderator.", parse_mode='HTML')
     except: pass
 
@@ -771,31 +933,62 @@ async def set_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not (0 <= start_h <= 23) or not (0 <= end_h <= 23): raise ValueError
         global START_HOUR, END_HOUR
         START_HOUR, END_HOUR = start_h, end_h
+        invalidate_active_state()
         save_time_settings()
         await update.message.reply_text(f"✅ Active time updated!\nStart: {format_time(START_HOUR)}\nEnd/Sleep: {format_time(END_HOUR)}")
     except: pass
 
+# Sends per second during /broadcast, kept under Telegram's ~30 msg/s bulk limit.
+BROADCAST_BATCH_SIZE = 25
+BROADCAST_PROGRESS_EVERY = 500
+BROADCAST_MAX_RETRIES = 3
+
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not update.message or not is_owner(update.message.from_user.id): return
+    if not update.message: return
     msg_text = " ".join(context.args)
     if not msg_text: return
-    await update.message.reply_text(f"📢 Broadcasting to {len(KNOWN_USERS)} users...")
-    sent, failed = 0, 0
-    for uid in list(KNOWN_USERS):
-        try:
-            await context.bot.send_message(chat_id=uid, text=msg_text)
-            sent += 1
-            await asyncio.sleep(0.05)
-        except: failed += 1
-    await update.message.reply_text(f"✅ Finished.\nSuccess: {sent}\nFailed: {failed}")
+    targets = list(KNOWN_USERS.difference(BANNED_USERS, BLOCKED_USERS))
+    total = len(targets)
+    status = await update.message.reply_text(f"📢 Broadcasting to {total} users...")
+    loop = asyncio.get_running_loop()
+    sent = 0
+    retries: Dict[int, int] = {}
+    i = 0
+    while i < len(targets):
+        batch_start = loop.time()
+        batch = targets[i:i + BROADCAST_BATCH_SIZE]
+        i += len(batch)
+        results = await asyncio.gather(
+            *(context.bot.send_message(chat_id=uid, text=msg_text) for uid in batch),
+            return_exceptions=True
+        )
+        sent += sum(1 for r in results if not isinstance(r, Exception))
+        # Users who blocked the bot are skipped until they message it again (see save_user).
+        unreachable = [uid for uid, r in zip(batch, results) if isinstance(r, Forbidden)]
+        if unreachable:
+            BLOCKED_USERS.update(unreachable)
+            mark_dirty('blocked_users')
+        # Flood-limited sends are queued again, up to BROADCAST_MAX_RETRIES times per user.
+        retry_after = 0
+        for uid, r in zip(batch, results):
+            if isinstance(r, RetryAfter):
+                retry_after = max(retry_after, r.retry_after.total_seconds() if isinstance(r.retry_after, datetime.timedelta) else r.retry_after)
+                if retries.get(uid, 0) < BROADCAST_MAX_RETRIES:
+                    retries[uid] = retries.get(uid, 0) + 1
+                    targets.append(uid)
+        if i >= len(targets): break
+        if i % BROADCAST_PROGRESS_EVERY == 0:
+            try: await status.edit_text(f"📢 Broadcasting to {total} users... ({sent}/{total} sent)")
+            except: pass
+        await asyncio.sleep(max(float(retry_after), 1.0 - (loop.time() - batch_start)))
+    await update.message.reply_text(f"✅ Finished.\nSuccess: {sent}\nFailed: {total - sent}")
 
 async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         target = int(context.args[0])
         reason = " ".join(context.args[1:]) if len(context.args) > 1 else "No reason provided."
         BANNED_USERS[target] = reason
-        with open("banned_users.txt", "w", encoding="utf-8") as f:
-            for u, r in BANNED_USERS.items(): f.write(f"{u},{r}\n")
+        with open("banned_users.txt", "a", encoding="utf-8") as f: f.write(f"{target},{reason}\n")
         await update.message.reply_text(f"🚫 User `{target}` banned.\n<b>Reason:</b> {html.escape(reason)}", parse_mode='HTML')
     except: pass
 
@@ -804,8 +997,7 @@ async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         target = int(context.args[0])
         if target in BANNED_USERS:
             del BANNED_USERS[target]
-            with open("banned_users.txt", "w", encoding="utf-8") as f:
-                for u, r in BANNED_USERS.items(): f.write(f"{u},{r}\n")
+            mark_dirty('banned_users')
             await update.message.reply_text(f"✅ User <code>{target}</code> unbanned.", parse_mode='HTML')
     except: pass
 
@@ -814,9 +1006,7 @@ async def timeout_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         target_id = int(context.args[0])
         minutes = int(context.args[1])
         reason = " ".join(context.args[2:]) if len(context.args) > 2 else "No reason provided."
-        expiry_time = datetime.datetime.now() + datetime.timedelta(minutes=minutes)
-        USER_TIMEOUTS[target_id] = {'expiry': expiry_time.timestamp(), 'reason': reason}
-        save_timeouts()
+        set_user_timeout(target_id, time.time() + minutes * 60, reason)
         await update.message.reply_text(f"⏳ User {target_id} timed out for {minutes}m.", parse_mode='HTML')
         
         str_id = str(target_id)
@@ -833,7 +1023,7 @@ async def remove_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
         target_id = int(context.args[0])
         if target_id in USER_TIMEOUTS:
             del USER_TIMEOUTS[target_id]
-            save_timeouts()
+            mark_dirty('timeouts')
             await update.message.reply_text(f"✅ Timeout removed for {target_id}.")
     except: pass
 
@@ -841,9 +1031,10 @@ async def add_banned_word(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         word = " ".join(context.args).lower()
         if not word: raise IndexError
-        BANNED_WORDS.add(word)
-        with open("banned_words.txt", "w", encoding="utf-8") as f:
-            for w in BANNED_WORDS: f.write(f"{w}\n")
+        if word not in BANNED_WORDS:
+            BANNED_WORDS.add(word)
+            with open("banned_words.txt", "a", encoding="utf-8") as f: f.write(f"{word}\n")
+            rebuild_banned_words_pattern()
         await update.message.reply_text(f"🚫 Banned word added: {word}")
     except: pass
 
@@ -852,8 +1043,8 @@ async def remove_banned_word(update: Update, context: ContextTypes.DEFAULT_TYPE)
         word = " ".join(context.args).lower()
         if not word: raise IndexError
         BANNED_WORDS.discard(word)
-        with open("banned_words.txt", "w", encoding="utf-8") as f:
-            for w in BANNED_WORDS: f.write(f"{w}\n")
+        mark_dirty('banned_words')
+        rebuild_banned_words_pattern()
         await update.message.reply_text(f"✅ Banned word removed: {word}")
     except: pass
 
@@ -861,15 +1052,13 @@ async def clear_queue(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global global_next_post_time
     if not update.message or not update.message.from_user: return
     if await is_user_restricted(update.message.from_user.id, update): return
-    global_next_post_time = datetime.datetime.now(TIMEZONE)
+    global_next_post_time = time.time()
     await update.message.reply_text("✅ Global Queue Master Line cleared.")
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.from_user: return AWAITING_HELP_MESSAGE
     user_id = update.message.from_user.id
-    if user_id not in AGREED_USERS and not is_owner(user_id):
-        await update.message.reply_text(TNC_TEXT, reply_markup=get_tnc_keyboard())
-        return ConversationHandler.END
+    if await prompt_tnc_if_needed(update, user_id): return ConversationHandler.END
     if await is_user_restricted(user_id, update): return ConversationHandler.END
     await update.message.reply_text("Send your query. It will be forwarded to the owner.")
     return AWAITING_HELP_MESSAGE
@@ -892,9 +1081,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.from_user: return
     user_id = update.message.from_user.id
-    if user_id not in AGREED_USERS and not is_owner(user_id):
-        await update.message.reply_text(TNC_TEXT, reply_markup=get_tnc_keyboard())
-        return
+    if await prompt_tnc_if_needed(update, user_id): return
     if await is_user_restricted(user_id, update): return
     save_user(user_id)
     if user_id in action_states: del action_states[user_id]
@@ -902,10 +1089,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     role_title, reply_markup = get_main_menu(user_id)
     greeting = f"👋 Hello! (Role: {role_title})\n\n" if role_title != "User" else "👋 Hello!\n\n"
     await update.message.reply_text(
-        f"{greeting}Send any text or photo to post it anonymously to the channel.\n\nClick a button below for more options:",
+        f"{greeting}{MENU_PROMPT_TEXT}",
         reply_markup=reply_markup
     )
 
+ACTION_PROMPTS = {
+    'trig_ban': "🔨 <b>Ban User</b>\nPlease send the target User ID and Reason.\n<i>Example:</i> <code>123456789 Spamming</code>\n\nType /cancel to abort.",
+    'trig_unban': "✅ <b>Unban User</b>\nPlease send the target User ID to unban.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
+    'trig_timeout': "⏱️ <b>Timeout User</b>\nPlease send the User ID, Minutes, and Reason.\n<i>Example:</i> <code>123456789 60 Flooding chat</code>\n\nType /cancel to abort.",
+    'trig_rmtimeout': "✅ <b>Remove Timeout</b>\nPlease send the target User ID to remove timeout.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
+    'trig_addmod': "➕ <b>Add Moderator</b>\nPlease send the User ID to promote.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
+    'trig_rmmod': "➖ <b>Remove Moderator</b>\nPlease send the User ID to demote.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
+    'trig_addword': "➕ <b>Add Banned Word</b>\nPlease send the word you want to ban.\n<i>Example:</i> <code>badword</code>\n\nType /cancel to abort.",
+    'trig_rmword': "➖ <b>Remove Banned Word</b>\nPlease send the word you want to unban.\n<i>Example:</i> <code>badword</code>\n\nType /cancel to abort.",
+    'trig_settime': "✏️ <b>Set Active Time</b>\nPlease send the Start and End hours (24h format).\n<i>Example for 9PM to 6PM:</i> <code>21 18</code>\n\nType /cancel to abort.",
+    'trig_setautoreply': "✏️ <b>Set Auto-Reply</b>\nPlease send the new auto-reply message you want the bot to say.\n\nType /cancel to abort."
+}
+
 async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global LINKS_ENABLED, PHOTOS_ENABLED, AUTO_REPLY_ENABLED 
     query = update.callback_query
@@ -917,28 +1117,26 @@ async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         role_title, reply_markup = get_main_menu(user_id)
         greeting = f"👋 Hello! (Role: {role_title})\n\n" if role_title != "User" else "👋 Hello!\n\n"
         await query.edit_message_text(
-            f"✅ Thank you for agreeing to the Terms and Conditions!\n\n{greeting}Send any text or photo to post it anonymously to the channel.\n\nClick a button below for more options:",
+            f"✅ Thank you for agreeing to the Terms and Conditions!\n\n{greeting}{MENU_PROMPT_TEXT}",
             reply_markup=reply_markup
         )
         return
     elif query.data == 'tc_guide':
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back to T&C", callback_data='tc_back')]])
-        await query.edit_message_text(text=GUIDE_TEXT, parse_mode='HTML', reply_markup=markup)
+        await query.edit_message_text(text=GUIDE_TEXT, parse_mode='HTML', reply_markup=TNC_GUIDE_MARKUP)
         return
     elif query.data == 'tc_back':
-        await query.edit_message_text(text=TNC_TEXT, reply_markup=get_tnc_keyboard())
+        await query.edit_message_text(text=TNC_TEXT, reply_markup=TNC_KEYBOARD)
         return
     if query.data == 'menu_back':
         if user_id in action_states: del action_states[user_id]
         role_title, reply_markup = get_main_menu(user_id)
         greeting = f"👋 Hello! (Role: {role_title})\n\n" if role_title != "User" else "👋 Hello!\n\n"
-        await query.edit_message_text(f"{greeting}Send any text or photo to post it anonymously to the channel.\n\nClick a button below for more options:", reply_markup=reply_markup)
+        await query.edit_message_text(f"{greeting}{MENU_PROMPT_TEXT}", reply_markup=reply_markup)
     elif query.data == 'menu_guide':
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
-        await query.edit_message_text(text=GUIDE_TEXT, parse_mode='HTML', reply_markup=markup)
+        await query.edit_message_text(text=GUIDE_TEXT, parse_mode='HTML', reply_markup=BACK_TO_MENU_MARKUP)
     elif query.data == 'menu_clear':
         global global_next_post_time
-        global_next_post_time = datetime.datetime.now(TIMEZONE)
+        global_next_post_time = time.time()
         await query.edit_message_text(text="✅ Global Queue Master Line cleared.")
     elif query.data == 'menu_close':
         if user_id in action_states: del action_states[user_id]
@@ -962,8 +1160,7 @@ async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"• Deletion Access: <code>{cfg['delete_access'].title()} posts</code>\n"
             f"• Deletion Cooldown: <code>{format_duration(cfg['delete_cooldown'])}</code>"
         )
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
-        await query.edit_message_text(text=txt, parse_mode='HTML', reply_markup=markup)
+        await query.edit_message_text(text=txt, parse_mode='HTML', reply_markup=BACK_TO_MENU_MARKUP)
 
     elif query.data == 'menu_stats':
         if not is_owner(user_id): return
@@ -980,8 +1177,7 @@ async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"📸 Photos: {'✅ Enabled' if PHOTOS_ENABLED else '❌ Disabled'}\n"
             f"🌙 Active Mode: {'✅ Yes' if is_bot_active() else '❌ No (Sleep/Queue Mode)'}"
         )
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
-        await query.edit_message_text(text=msg, parse_mode='HTML', reply_markup=markup)
+        await query.edit_message_text(text=msg, parse_mode='HTML', reply_markup=BACK_TO_MENU_MARKUP)
 
     elif query.data == 'menu_tnc_stats':
         if not is_owner(user_id): return
@@ -995,23 +1191,20 @@ async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"⏳ <b>Pending Agreement:</b> <code>{pending_users}</code>\n\n"
             f"<i>Note: Users in the 'Pending' list cannot send confessions or use the bot until they click 'I Agree'.</i>"
         )
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
-        await query.edit_message_text(text=msg, parse_mode='HTML', reply_markup=markup)
+        await query.edit_message_text(text=msg, parse_mode='HTML', reply_markup=BACK_TO_MENU_MARKUP)
         
     elif query.data == 'menu_toggle_links':
         if not is_owner(user_id): return
         LINKS_ENABLED = not LINKS_ENABLED
         status = 'ENABLED' if LINKS_ENABLED else 'DISABLED'
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
-        await query.edit_message_text(text=f"🔗 Link restriction is now {'OFF' if LINKS_ENABLED else 'ON'}.", reply_markup=markup)
+        await query.edit_message_text(text=f"🔗 Link restriction is now {'OFF' if LINKS_ENABLED else 'ON'}.", reply_markup=BACK_TO_MENU_MARKUP)
         await context.bot.send_message(chat_id=CHANNEL_ID, text=f"📢 Notice: Link sharing has been {status} by the administrator.")
 
     elif query.data == 'menu_toggle_photos':
         if not is_owner(user_id): return
         PHOTOS_ENABLED = not PHOTOS_ENABLED
         status = 'ENABLED' if PHOTOS_ENABLED else 'DISABLED'
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
-        await query.edit_message_text(text=f"📸 Photo posts are now {'ENABLED' if PHOTOS_ENABLED else 'DISABLED'}.", reply_markup=markup)
+        await query.edit_message_text(text=f"📸 Photo posts are now {'ENABLED' if PHOTOS_ENABLED else 'DISABLED'}.", reply_markup=BACK_TO_MENU_MARKUP)
         await context.bot.send_message(chat_id=CHANNEL_ID, text=f"📢 Notice: Photo confessions have been {status} by the administrator.")
 
     elif query.data == 'menu_autoreply':
@@ -1042,8 +1235,7 @@ async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"⏰ <b>Active Time Panel</b>\n\n<b>Current Start Time:</b> {format_time(START_HOUR)}\n<b>Current End (Sleep) Time:</b> {format_time(END_HOUR)}\n\n"
             f"<b>How to change it:</b>\nType <code>/settime &lt;start_hour&gt; &lt;end_hour&gt;</code> using the 24-hour clock.\n\n<i>Example for 9 PM to 6 PM:</i>\n<code>/settime 21 18</code>"
         )
-        markup = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Back", callback_data='menu_back')]])
-        await query.edit_message_text(text=txt, parse_mode='HTML', reply_markup=markup)
+        await query.edit_message_text(text=txt, parse_mode='HTML', reply_markup=BACK_TO_MENU_MARKUP)
 
     elif query.data == 'menu_manage_mods':
         if not is_owner(user_id): return
@@ -1090,23 +1282,11 @@ async def menu_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     elif query.data.startswith('trig_'):
         action_states[user_id] = query.data
-        prompts = {
-            'trig_ban': "🔨 <b>Ban User</b>\nPlease send the target User ID and Reason.\n<i>Example:</i> <code>123456789 Spamming</code>\n\nType /cancel to abort.",
-            'trig_unban': "✅ <b>Unban User</b>\nPlease send the target User ID to unban.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
-            'trig_timeout': "⏱️ <b>Timeout User</b>\nPlease send the User ID, Minutes, and Reason.\n<i>Example:</i> <code>123456789 60 Flooding chat</code>\n\nType /cancel to abort.",
-            'trig_rmtimeout': "✅ <b>Remove Timeout</b>\nPlease send the target User ID to remove timeout.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
-            'trig_addmod': "➕ <b>Add Moderator</b>\nPlease send the User ID to promote.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
-            'trig_rmmod': "➖ <b>Remove Moderator</b>\nPlease send the User ID to demote.\n<i>Example:</i> <code>123456789</code>\n\nType /cancel to abort.",
-            'trig_addword': "➕ <b>Add Banned Word</b>\nPlease send the word you want to ban.\n<i>Example:</i> <code>badword</code>\n\nType /cancel to abort.",
-            'trig_rmword': "➖ <b>Remove Banned Word</b>\nPlease send the word you want to unban.\n<i>Example:</i> <code>badword</code>\n\nType /cancel to abort.",
-            'trig_settime': "✏️ <b>Set Active Time</b>\nPlease send the Start and End hours (24h format).\n<i>Example for 9PM to 6PM:</i> <code>21 18</code>\n\nType /cancel to abort.",
-            'trig_setautoreply': "✏️ <b>Set Auto-Reply</b>\nPlease send the new auto-reply message you want the bot to say.\n\nType /cancel to abort."
-        }
-        await query.edit_message_text(text=prompts.get(query.data, "Please provide input. Type /cancel to abort."), parse_mode='HTML')
+        await query.edit_message_text(text=ACTION_PROMPTS.get(query.data, "Please provide input. Type /cancel to abort."), parse_mode='HTML')
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if isinstance(context.error, NetworkError): return
-    print(f"Update {update} caused error {context.error}")
+    logger.error("Update %s caused error", update, exc_info=context.error)
 
 async def post_init(application: Application):
     now_str = datetime.datetime.now(TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')
@@ -1114,12 +1294,17 @@ async def post_init(application: Application):
         await application.bot.send_message(chat_id=OWNER_ID, text=f"✅ Main Bot is up! Running v20+. Started at {now_str}")
     except Exception as e: pass
 
+async def post_shutdown(application: Application):
+    flush_dirty_stores()
+
 def main():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    application = ApplicationBuilder().token(TOKEN).post_init(post_init).read_timeout(30).connect_timeout(30).build()
+    application = ApplicationBuilder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).http_version("2").read_timeout(30).connect_timeout(30).pool_timeout(30).build()
     
     application.add_error_handler(error_handler)
+    application.job_queue.run_repeating(flush_dirty_stores_job, interval=30)
+    application.add_handler(TypeHandler(Update, ban_gate), group=-1)
     application.add_handler(ConversationHandler(
         entry_points=[CommandHandler('help', help_command)],
         states={AWAITING_HELP_MESSAGE: [MessageHandler(filters.ALL & ~filters.COMMAND, forward_help)]},
@@ -1128,24 +1313,23 @@ def main():
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("cancel", cancel)) 
-    application.add_handler(CommandHandler("settime", set_time))
-    application.add_handler(CommandHandler("broadcast", broadcast))
-    application.add_handler(CommandHandler("ban", ban_user))
-    application.add_handler(CommandHandler("unban", unban_user))
-    application.add_handler(CommandHandler("addmod", add_mod))
-    application.add_handler(CommandHandler("removemod", remove_mod))
-    application.add_handler(CommandHandler("timeout", timeout_user))
-    application.add_handler(CommandHandler("untimeout", remove_timeout))
-    application.add_handler(CommandHandler("addban", add_banned_word))
-    application.add_handler(CommandHandler("removeban", remove_banned_word))
-    application.add_handler(CommandHandler("clearqueue", clear_queue))
-    application.add_handler(CommandHandler("revoke", revoke_subscription))
+    application.add_handler(CommandHandler("settime", set_time, filters=OWNER_FILTER))
+    application.add_handler(CommandHandler("broadcast", broadcast, filters=OWNER_FILTER, block=False))
+    application.add_handler(CommandHandler("ban", ban_user, filters=STAFF_FILTER))
+    application.add_handler(CommandHandler("unban", unban_user, filters=STAFF_FILTER))
+    application.add_handler(CommandHandler("addmod", add_mod, filters=OWNER_FILTER))
+    application.add_handler(CommandHandler("removemod", remove_mod, filters=OWNER_FILTER))
+    application.add_handler(CommandHandler("timeout", timeout_user, filters=STAFF_FILTER))
+    application.add_handler(CommandHandler("untimeout", remove_timeout, filters=STAFF_FILTER))
+    application.add_handler(CommandHandler("addban", add_banned_word, filters=STAFF_FILTER))
+    application.add_handler(CommandHandler("removeban", remove_banned_word, filters=STAFF_FILTER))
+    application.add_handler(CommandHandler("clearqueue", clear_queue, filters=STAFF_FILTER))
+    application.add_handler(CommandHandler("revoke", revoke_subscription, filters=OWNER_FILTER))
 
     application.add_handler(CallbackQueryHandler(menu_button_handler, pattern='^(menu_|trig_|toggle_|tc_)'))
     application.add_handler(MessageHandler(filters.FORWARDED, handle_delete))
     application.add_handler(MessageHandler((filters.ChatType.SUPERGROUP | filters.ChatType.GROUPS) & ~filters.COMMAND, group_auto_reply))
-    application.add_handler(MessageHandler(filters.ChatType.PRIVATE & filters.PHOTO, handle_photo_input))
-    application.add_handler(MessageHandler(filters.ChatType.PRIVATE & filters.TEXT & ~filters.COMMAND, handle_text_input))
+    application.add_handler(MessageHandler(filters.ChatType.PRIVATE & (filters.PHOTO | (filters.TEXT & ~filters.COMMAND)), handle_private_input))
 
     print("--- Main Confession Bot is Online ---")
     application.run_polling()